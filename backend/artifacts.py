@@ -0,0 +1,112 @@
+# artifacts.py - Persistent pipeline artifacts keyed by audio hash
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+from typing import Optional, List
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = os.environ.get(
+    "ARTIFACTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"),
+)
+
+# Pipeline stages in execution order. Each stage only depends on the one
+# before it, so a stale stage invalidates everything after it.
+STAGES = ["transcription", "activities", "emissions"]
+
+def audio_hash(audio_data: bytes) -> str:
+    """Return the cache key for a piece of audio"""
+    return hashlib.sha256(audio_data).hexdigest()
+
+def artifact_path(key: str) -> str:
+    return os.path.join(ARTIFACTS_DIR, f"{key}.json")
+
+def load_artifact(key: str) -> Optional[dict]:
+    """Load the stored artifact for an audio hash, or None if missing/unreadable"""
+    path = artifact_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error reading artifact {path}: {e}")
+        return None
+
+def save_artifact(key: str, artifact: dict) -> None:
+    """Atomically write an artifact so readers never see a partial file"""
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    artifact["updated_at"] = datetime.now().isoformat()
+    fd, temp_path = tempfile.mkstemp(dir=ARTIFACTS_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, indent=2)
+        os.replace(temp_path, artifact_path(key))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def list_artifacts() -> List[str]:
+    """Return the audio hashes of every stored artifact"""
+    if not os.path.isdir(ARTIFACTS_DIR):
+        return []
+    return sorted(
+        name[:-len(".json")]
+        for name in os.listdir(ARTIFACTS_DIR)
+        if name.endswith(".json")
+    )
+
+def get_stage(artifact: Optional[dict], stage: str, version: str):
+    """Return the cached output of a stage if it was produced by `version`"""
+    if not artifact:
+        return None
+    entry = artifact.get(stage)
+    if not entry or entry.get("version") != version:
+        return None
+    return entry.get("data")
+
+def set_stage(artifact: dict, stage: str, version: str, data) -> None:
+    artifact[stage] = {"version": version, "data": data}
+
+def stale_stages(artifact: dict, versions: dict) -> List[str]:
+    """Return the stages that must be recomputed to match `versions`.
+
+    Only stages present in `versions` are checked; once one is stale, every
+    stage downstream of it is stale as well.
+    """
+    for index, stage in enumerate(STAGES):
+        if stage not in versions:
+            continue
+        entry = artifact.get(stage)
+        if not entry or entry.get("version") != versions[stage]:
+            return STAGES[index:]
+    return []
+
+def rescore_artifact(artifact: dict, versions: dict, extract_activities, calculate_emissions, nlp=None) -> List[str]:
+    """Recompute the stale stages of an artifact in place.
+
+    Transcription is never recomputed here since the audio is not kept;
+    extraction and calculation are re-run from the cached transcript.
+    Returns the list of stages that were recomputed.
+    """
+    if "transcription" not in artifact:
+        return []
+
+    stale = [stage for stage in stale_stages(artifact, versions) if stage != "transcription"]
+    text = artifact["transcription"]["data"]
+
+    if "activities" in stale:
+        activities = extract_activities(text, nlp) if text else []
+        set_stage(artifact, "activities", versions["activities"], activities)
+
+    if "emissions" in stale:
+        # Mirror process_audio_data: no speech means no emissions at all
+        emissions = calculate_emissions(artifact["activities"]["data"]) if text else []
+        set_stage(artifact, "emissions", versions["emissions"], emissions)
+
+    return stale
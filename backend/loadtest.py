@@ -0,0 +1,417 @@
+# loadtest.py - Local load generator for the websocket and upload endpoints
+#
+# Runs main.app under uvicorn in a background thread with a stub transcriber
+# (no Whisper weights needed) and replays synthetic audio at fixed rates:
+#
+#   python loadtest.py                                   # default workload
+#   python loadtest.py --upload-rate 2 --ws-connections 50 --ws-rate 0.05 --duration 30
+#   python loadtest.py --transcribe-ms 1500 --upload-rate 0.5 --health-threshold-ms 100
+#
+# main.py runs one transcription at a time, so a single worker sustains about
+# 1000 / --transcribe-ms audio requests per second; above that, requests queue.
+#
+# Reports p50/p95/p99 latency and error rate per endpoint plus event-loop lag
+# of the server, and exits with status 1 when /health p99 latency exceeds the
+# threshold while transcriptions are in flight (or too many requests fail).
+# Needs the packages in requirements-loadtest.txt.
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import math
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+import wave
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Transcripts returned by the stub transcriber, cycling through every
+# activity type that utils.extract_activities knows about.
+SYNTHETIC_TRANSCRIPTS = [
+    "I drove 12 km to work this morning.",
+    "I cooked a beef dinner for 2 servings. Then I did 1 load of laundry.",
+    "I took a 15 minutes shower and walked 3 km to the store.",
+    "I took the bus 8 km to the office. I had a chicken salad for lunch.",
+    "I flew 900 km to visit family and took the train back from the airport.",
+    "I biked 5 km to the park.",
+    "",
+]
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+def synthetic_wav(seconds: float = 1.0, sample_rate: int = 16000) -> bytes:
+    """Return a mono 16-bit WAV of random noise.
+
+    Every clip is different so the artifact cache never short-circuits
+    transcription.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(os.urandom(int(seconds * sample_rate) * 2))
+    return buffer.getvalue()
+
+class StubTranscriber:
+    """Stand-in for the Whisper model with a fixed, blocking transcription time.
+
+    Like the real model it must never be called concurrently; overlapping
+    calls are counted and fail, so the harness catches a missing lock in
+    main.py.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.in_flight = 0
+        self.overlaps = 0
+        self._lock = threading.Lock()
+
+    def transcribe(self, path):
+        with self._lock:
+            if self.in_flight:
+                self.overlaps += 1
+                raise RuntimeError("transcribe() entered while another transcription was running")
+            self.in_flight += 1
+        try:
+            # Whisper holds a worker thread for the whole call; so does this
+            time.sleep(self.delay)
+            return {"text": random.choice(SYNTHETIC_TRANSCRIPTS)}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+class StubNLP:
+    """Minimal spaCy replacement: only provides sentence splitting"""
+
+    def __call__(self, text):
+        sentences = [s.strip() for s in re.split(r"[.!?]\s*", text) if s.strip()]
+        return SimpleNamespace(sents=[SimpleNamespace(text=s) for s in sentences])
+
+def install_stubs(app_module, transcriber: StubTranscriber, artifacts_dir: str) -> None:
+    """Wire stub models into main.py in place of its startup event"""
+    import artifacts
+    from utils import extract_activities, calculate_emissions, get_stage_versions
+
+    artifacts.ARTIFACTS_DIR = artifacts_dir
+    app_module.whisper_model = transcriber
+    app_module.nlp = StubNLP()
+    app_module.extract_activities = extract_activities
+    app_module.calculate_emissions = calculate_emissions
+    app_module.get_stage_versions = get_stage_versions
+
+class Stats:
+    """Latency samples and error count for one workload"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def record(self, started: float, ok: bool) -> None:
+        self.latencies.append(time.perf_counter() - started)
+        if not ok:
+            self.errors += 1
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.count,
+            "errors": self.errors,
+            "error_rate": self.errors / self.count if self.count else 0.0,
+            "p50_ms": _ms(percentile(self.latencies, 50)),
+            "p95_ms": _ms(percentile(self.latencies, 95)),
+            "p99_ms": _ms(percentile(self.latencies, 99)),
+        }
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+class ServerThread(threading.Thread):
+    """Runs the ASGI app under uvicorn on its own loop and samples event-loop lag"""
+
+    def __init__(self, app, port: int, lag_interval: float = 0.01):
+        super().__init__(daemon=True)
+        import uvicorn
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.lag_interval = lag_interval
+        self.lag_samples: List[float] = []
+
+    async def _monitor_lag(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.lag_samples.append(max(0.0, time.perf_counter() - started - self.lag_interval))
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        monitor = loop.create_task(self._monitor_lag())
+        try:
+            loop.run_until_complete(self.server.serve())
+        finally:
+            monitor.cancel()
+            loop.run_until_complete(asyncio.gather(monitor, return_exceptions=True))
+            loop.close()
+
+    def start_and_wait(self, timeout: float = 10.0) -> None:
+        self.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.join(timeout=10)
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def upload_worker(client, rate: float, deadline: float, stats: Stats, tasks: list):
+    """Open-loop POSTs to /api/upload-audio at `rate` requests per second"""
+
+    async def one():
+        started = time.perf_counter()
+        try:
+            files = {"audio": ("load.wav", synthetic_wav(), "audio/wav")}
+            response = await client.post("/api/upload-audio", files=files)
+            stats.record(started, response.status_code == 200)
+        except Exception as e:
+            logger.debug(f"Upload failed: {e}")
+            stats.record(started, False)
+
+    await _open_loop(one, rate, deadline, tasks)
+
+async def process_worker(client, rate: float, deadline: float, stats: Stats, tasks: list):
+    """Open-loop base64 POSTs to /api/process-audio at `rate` requests per second"""
+
+    async def one():
+        started = time.perf_counter()
+        try:
+            payload = {"audio_data": base64.b64encode(synthetic_wav()).decode("ascii")}
+            response = await client.post("/api/process-audio", json=payload)
+            stats.record(started, response.status_code == 200)
+        except Exception as e:
+            logger.debug(f"Process request failed: {e}")
+            stats.record(started, False)
+
+    await _open_loop(one, rate, deadline, tasks)
+
+async def _open_loop(one, rate: float, deadline: float, tasks: list):
+    # Arrivals are scheduled on a fixed clock so slow responses do not
+    # throttle the offered load
+    if rate <= 0:
+        return
+    interval = 1.0 / rate
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        tasks.append(asyncio.create_task(one()))
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+async def ws_worker(url: str, rate: float, deadline: float, stats: Stats):
+    """One persistent /ws/audio connection sending audio at `rate` messages per second"""
+    import websockets
+
+    interval = 1.0 / rate if rate > 0 else 0.0
+    connected = time.perf_counter()
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                data = base64.b64encode(synthetic_wav()).decode("ascii")
+                try:
+                    await ws.send(json.dumps({"type": "audio_data", "data": data}))
+                    reply = json.loads(await ws.recv())
+                    stats.record(started, reply.get("type") == "result")
+                except Exception as e:
+                    logger.debug(f"WebSocket message failed: {e}")
+                    stats.record(started, False)
+                    return
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+    except Exception as e:
+        logger.debug(f"WebSocket connection failed: {e}")
+        stats.record(connected, False)
+
+async def health_prober(client, interval: float, deadline: float, transcriber: StubTranscriber,
+                        busy: Stats, idle: Stats):
+    """Poll /health, splitting samples by whether a transcription was running"""
+    while time.perf_counter() < deadline:
+        in_flight = transcriber.in_flight > 0
+        started = time.perf_counter()
+        try:
+            response = await client.get("/health")
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        in_flight = in_flight or transcriber.in_flight > 0
+        (busy if in_flight else idle).record(started, ok)
+        await asyncio.sleep(interval)
+
+async def run_workload(base_url: str, args, transcriber: StubTranscriber) -> Dict[str, Stats]:
+    import httpx
+
+    stats = {
+        "upload": Stats("/api/upload-audio"),
+        "process": Stats("/api/process-audio"),
+        "websocket": Stats("/ws/audio"),
+        "health_busy": Stats("/health (transcribing)"),
+        "health_idle": Stats("/health (idle)"),
+    }
+    deadline = time.perf_counter() + args.duration
+    ws_url = base_url.replace("http://", "ws://") + "/ws/audio"
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    pending: list = []
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        workers = [
+            upload_worker(client, args.upload_rate, deadline, stats["upload"], pending),
+            process_worker(client, args.process_rate, deadline, stats["process"], pending),
+            health_prober(client, args.health_interval_ms / 1000.0, deadline, transcriber,
+                          stats["health_busy"], stats["health_idle"]),
+        ]
+        workers += [
+            ws_worker(ws_url, args.ws_rate, deadline, stats["websocket"])
+            for _ in range(args.ws_connections)
+        ]
+        await asyncio.gather(*workers)
+        # Let requests issued just before the deadline finish
+        await asyncio.gather(*pending)
+
+    return stats
+
+def run_load_test(args) -> Dict:
+    """Start the app with stub models, apply the workload and return a report"""
+    import main as api
+
+    # main.py configures INFO logging; keep per-request logs out of the report
+    for name in ("main", "artifacts", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    transcriber = StubTranscriber(args.transcribe_ms / 1000.0)
+    artifacts_dir = tempfile.TemporaryDirectory(prefix="loadtest-artifacts-")
+    install_stubs(api, transcriber, artifacts_dir.name)
+
+    port = free_port()
+    server = ServerThread(api.app, port)
+    try:
+        server.start_and_wait()
+        stats = asyncio.run(run_workload(f"http://127.0.0.1:{port}", args, transcriber))
+    finally:
+        server.stop()
+        artifacts_dir.cleanup()
+
+    workloads = {name: s.summary() for name, s in stats.items()}
+    lag = server.lag_samples
+    report = {
+        "workloads": workloads,
+        "event_loop_lag": {
+            "samples": len(lag),
+            "p50_ms": _ms(percentile(lag, 50)),
+            "p99_ms": _ms(percentile(lag, 99)),
+            "max_ms": _ms(max(lag) if lag else None),
+        },
+        "failures": [],
+    }
+
+    if transcriber.overlaps:
+        report["failures"].append(
+            f"{transcriber.overlaps} transcriptions started while another was still running"
+        )
+    health_p99 = workloads["health_busy"]["p99_ms"]
+    if health_p99 is None:
+        report["failures"].append("No /health samples taken while transcriptions were in flight")
+    elif health_p99 > args.health_threshold_ms:
+        report["failures"].append(
+            f"/health p99 {health_p99} ms exceeds {args.health_threshold_ms} ms while transcribing"
+        )
+    for name in ("upload", "process", "websocket"):
+        summary = workloads[name]
+        if summary["requests"] and summary["error_rate"] > args.max_error_rate:
+            report["failures"].append(
+                f"{stats[name].name} error rate {summary['error_rate']:.1%} exceeds {args.max_error_rate:.1%}"
+            )
+    return report
+
+def print_report(report: Dict) -> None:
+    print(f"{'endpoint':<26}{'reqs':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, summary in report["workloads"].items():
+        if not summary["requests"]:
+            continue
+        print(
+            f"{name:<26}{summary['requests']:>7}{summary['errors']:>8}"
+            f"{_fmt(summary['p50_ms']):>10}{_fmt(summary['p95_ms']):>10}{_fmt(summary['p99_ms']):>10}"
+        )
+    lag = report["event_loop_lag"]
+    print(f"\nEvent-loop lag: p50 {_fmt(lag['p50_ms'])} ms, p99 {_fmt(lag['p99_ms'])} ms, "
+          f"max {_fmt(lag['max_ms'])} ms ({lag['samples']} samples)")
+    if report["failures"]:
+        print("\nFAILED")
+        for failure in report["failures"]:
+            print(f"  - {failure}")
+    else:
+        print("\nPASSED")
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Carbon Footprint API with a stub transcriber")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to generate load")
+    parser.add_argument("--upload-rate", type=float, default=2.0, help="/api/upload-audio requests per second")
+    parser.add_argument("--process-rate", type=float, default=0.0, help="/api/process-audio requests per second")
+    parser.add_argument("--ws-connections", type=int, default=4, help="concurrent /ws/audio connections")
+    parser.add_argument("--ws-rate", type=float, default=0.5, help="messages per second per websocket")
+    parser.add_argument("--transcribe-ms", type=float, default=200.0,
+                        help="stub transcription time; transcriptions run one at a time")
+    parser.add_argument("--health-interval-ms", type=float, default=50.0, help="/health polling interval")
+    parser.add_argument("--health-threshold-ms", type=float, default=250.0,
+                        help="fail if /health p99 exceeds this while transcribing")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="fail above this error rate (0-1)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client request timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        import httpx  # noqa: F401
+        import uvicorn  # noqa: F401
+        import websockets  # noqa: F401
+    except ImportError as e:
+        print(f"Missing load test dependency ({e.name}). Run: pip install -r requirements-loadtest.txt")
+        return 2
+
+    report = run_load_test(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 import os
 import tempfile
@@ -10,6 +11,10 @@ import base64
 import asyncio
 from io import BytesIO
 import wave
+import threading
+from datetime import datetime
+
+import artifacts
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,9 +31,15 @@ app.add_middleware(
 )
 
 # Global variables for models
+WHISPER_MODEL_NAME = "base"
 whisper_model = None
 nlp = None
 
+# Requests run process_audio_data in the threadpool, but the shared Whisper
+# model is not thread-safe (its decoder KV-cache hooks are per model), so
+# only one transcription may run at a time.
+transcribe_lock = threading.Lock()
+
 @app.on_event("startup")
 async def startup_event():
     """Load models on startup"""
@@ -38,7 +49,7 @@ async def startup_event():
     try:
         logger.info("Loading Whisper model...")
         import whisper
-        whisper_model = whisper.load_model("base")
+        whisper_model = whisper.load_model(WHISPER_MODEL_NAME)
         logger.info("Whisper model loaded successfully!")
     except ImportError:
         logger.error("Whisper not installed. Run: pip install openai-whisper")
@@ -65,8 +76,8 @@ async def startup_event():
 
     # Load utils functions
     try:
-        global extract_activities, calculate_emissions
-        from utils import extract_activities, calculate_emissions
+        global extract_activities, calculate_emissions, get_stage_versions
+        from utils import extract_activities, calculate_emissions, get_stage_versions
         logger.info("Utils module loaded successfully!")
     except ImportError:
         logger.error("utils.py not found. Make sure it exists in the same directory.")
@@ -88,6 +99,13 @@ async def health_check():
         "models_ready": whisper_model is not None and nlp is not None
     }
 
+def save_pipeline_artifact(audio_key: str, artifact: dict) -> None:
+    """Persist intermediate results; a failed write must not fail the request"""
+    try:
+        artifacts.save_artifact(audio_key, artifact)
+    except Exception as e:
+        logger.error(f"Error saving pipeline artifact {audio_key[:12]}: {e}")
+
 def process_audio_data(audio_data: bytes) -> dict:
     """Process audio data and return results"""
     # Check if models are loaded
@@ -111,24 +129,41 @@ def process_audio_data(audio_data: bytes) -> dict:
         if len(audio_data) == 0:
             raise HTTPException(status_code=400, detail="Audio data is empty")
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            temp_file.write(audio_data)
-            temp_audio_path = temp_file.name
-        
-        logger.info(f"Saved temporary file: {temp_audio_path}")
+        # Reuse any stage outputs already stored for this audio
+        audio_key = artifacts.audio_hash(audio_data)
+        artifact = artifacts.load_artifact(audio_key) or {}
+        versions = get_stage_versions(nlp)
+        versions["transcription"] = f"whisper-{WHISPER_MODEL_NAME}"
         
-        # Transcribe audio
-        logger.info("Starting transcription...")
-        try:
-            result = whisper_model.transcribe(temp_audio_path)
-            text = result["text"].strip()
-            logger.info(f"Transcription completed: '{text}'")
-        except Exception as e:
-            logger.error(f"Transcription failed: {e}")
-            raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+        text = artifacts.get_stage(artifact, "transcription", versions["transcription"])
+        if text is not None:
+            logger.info(f"Using cached transcription for {audio_key[:12]}: '{text}'")
+        else:
+            # Create temporary file
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
+                temp_file.write(audio_data)
+                temp_audio_path = temp_file.name
+            
+            logger.info(f"Saved temporary file: {temp_audio_path}")
+            
+            # Transcribe audio
+            logger.info("Starting transcription...")
+            try:
+                with transcribe_lock:
+                    result = whisper_model.transcribe(temp_audio_path)
+                text = result["text"].strip()
+                logger.info(f"Transcription completed: '{text}'")
+            except Exception as e:
+                logger.error(f"Transcription failed: {e}")
+                raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+            
+            # A new transcript invalidates everything downstream of it
+            artifact = {"audio_hash": audio_key}
+            artifacts.set_stage(artifact, "transcription", versions["transcription"], text)
         
         if not text:
+            if temp_audio_path:
+                save_pipeline_artifact(audio_key, artifact)
             return {
                 "transcription": "No speech detected",
                 "activities": [],
@@ -136,22 +171,36 @@ def process_audio_data(audio_data: bytes) -> dict:
             }
         
         # Extract activities
-        logger.info("Extracting activities...")
-        try:
-            activities = extract_activities(text, nlp)
-            logger.info(f"Found {len(activities)} activities: {activities}")
-        except Exception as e:
-            logger.error(f"Activity extraction failed: {e}")
-            raise HTTPException(status_code=500, detail=f"Activity extraction failed: {str(e)}")
+        activities = artifacts.get_stage(artifact, "activities", versions["activities"])
+        if activities is not None:
+            # Cached activities keep the extraction time of the first request;
+            # stamp them with this request's time like a fresh extraction would
+            now = datetime.now().isoformat()
+            activities = [dict(activity, timestamp=now) for activity in activities]
+        else:
+            logger.info("Extracting activities...")
+            try:
+                activities = extract_activities(text, nlp)
+                logger.info(f"Found {len(activities)} activities: {activities}")
+            except Exception as e:
+                logger.error(f"Activity extraction failed: {e}")
+                raise HTTPException(status_code=500, detail=f"Activity extraction failed: {str(e)}")
+            artifacts.set_stage(artifact, "activities", versions["activities"], activities)
+            # Emissions derived from older activities are no longer valid
+            artifact.pop("emissions", None)
         
         # Calculate emissions
-        logger.info("Calculating emissions...")
-        try:
-            emissions = calculate_emissions(activities)
-            logger.info(f"Calculated {len(emissions)} emissions")
-        except Exception as e:
-            logger.error(f"Emission calculation failed: {e}")
-            raise HTTPException(status_code=500, detail=f"Emission calculation failed: {str(e)}")
+        emissions = artifacts.get_stage(artifact, "emissions", versions["emissions"])
+        if emissions is None:
+            logger.info("Calculating emissions...")
+            try:
+                emissions = calculate_emissions(activities)
+                logger.info(f"Calculated {len(emissions)} emissions")
+            except Exception as e:
+                logger.error(f"Emission calculation failed: {e}")
+                raise HTTPException(status_code=500, detail=f"Emission calculation failed: {str(e)}")
+            artifacts.set_stage(artifact, "emissions", versions["emissions"], emissions)
+            save_pipeline_artifact(audio_key, artifact)
         
         return {
             "transcription": text,
@@ -207,8 +256,9 @@ async def upload_audio(audio: UploadFile = File(...)):
             temp_file.write(content)
             temp_audio_path = temp_file.name
         
-        # Process the audio using the shared function
-        result = process_audio_data(content)
+        # Process the audio using the shared function. Transcription is
+        # blocking, so keep it off the event loop.
+        result = await run_in_threadpool(process_audio_data, content)
         return result
         
     except HTTPException:
@@ -250,7 +300,7 @@ async def process_audio_endpoint(audio_data: dict):
             raise HTTPException(status_code=400, detail=f"Invalid base64 data: {str(e)}")
         
         # Process the audio
-        result = process_audio_data(audio_bytes)
+        result = await run_in_threadpool(process_audio_data, audio_bytes)
         return result
         
     except HTTPException:
@@ -283,7 +333,7 @@ async def websocket_audio(websocket: WebSocket):
                     
                     # Decode and process audio
                     audio_bytes = base64.b64decode(base64_data)
-                    result = process_audio_data(audio_bytes)
+                    result = await run_in_threadpool(process_audio_data, audio_bytes)
                     
                     # Send result back
                     await websocket.send_text(json.dumps({
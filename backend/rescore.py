@@ -0,0 +1,142 @@
+# rescore.py - Refresh stored results after emission factor or keyword changes
+#
+# Usage:
+#   python rescore.py             # recompute stale stages and save them
+#   python rescore.py --dry-run   # only report what would change
+#   python rescore.py --no-spacy  # run without the spaCy model
+#
+# When the only difference from an artifact's activities version is the
+# sentence splitter (e.g. spaCy on the server but --no-spacy or a missing
+# model here), the cached activities are kept and only emissions are
+# recomputed, so factor-only updates work without spaCy. If activities
+# really need re-extracting, such artifacts are skipped: doing it with a
+# different splitter would make the server treat them as stale and extract
+# them again on the next request. Pass --allow-nlp-change to do it anyway.
+#
+# Transcripts are never recomputed, so Whisper never runs and no Whisper
+# weights are loaded. The same packages as main.py must still be installed:
+# utils.py imports whisper and spacy at module level.
+import argparse
+import logging
+import sys
+
+import artifacts
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+def load_nlp():
+    """Load spaCy the same way main.py does, falling back to no model"""
+    # spacy itself is always importable here since utils.py already needs it
+    import spacy
+
+    try:
+        return spacy.load("en_core_web_sm")
+    except OSError:
+        logger.error("spaCy model 'en_core_web_sm' not found. Run: python -m spacy download en_core_web_sm")
+    except Exception as e:
+        logger.error(f"Error loading spaCy model: {e}")
+    return None
+
+def get_total(artifact: dict):
+    """Return the total emission stored in an artifact, if any"""
+    emissions = (artifact.get("emissions") or {}).get("data") or []
+    if emissions and emissions[-1].get("type") == "summary":
+        return emissions[-1]["emission"]
+    return None
+
+def split_activities_version(version: str):
+    """Split an activities version into (extraction part, nlp name)"""
+    # Versions look like "<extraction version>-<keyword hash>-<nlp name>"
+    parts = version.split("-", 2)
+    if len(parts) != 3:
+        return version, None
+    return "-".join(parts[:2]), parts[2]
+
+def artifact_versions(artifact: dict, versions: dict, nlp_name: str):
+    """Return the versions to check an artifact against, and whether its
+    activities were extracted with a different sentence splitter.
+
+    If extraction is otherwise current, the stored activities version is kept
+    so the cached activities stay valid and only emissions are recomputed.
+    """
+    stored = (artifact.get("activities") or {}).get("version", "")
+    stored_extraction, stored_nlp = split_activities_version(stored)
+    if not stored_nlp or stored_nlp == nlp_name:
+        return versions, False
+    current_extraction, _ = split_activities_version(versions["activities"])
+    if stored_extraction == current_extraction:
+        return dict(versions, activities=stored), False
+    return versions, True
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Re-score stored pipeline artifacts")
+    parser.add_argument("--dry-run", action="store_true", help="report stale artifacts without saving")
+    parser.add_argument("--no-spacy", action="store_true",
+                        help="run without the spaCy model; enough for emission-only updates")
+    parser.add_argument("--allow-nlp-change", action="store_true",
+                        help="re-extract artifacts produced with a different sentence splitter")
+    args = parser.parse_args(argv)
+
+    from utils import extract_activities, calculate_emissions, get_stage_versions, get_nlp_name
+
+    nlp = None if args.no_spacy else load_nlp()
+    nlp_name = get_nlp_name(nlp)
+    versions = get_stage_versions(nlp)
+    logger.info(f"Stage versions: {versions}")
+
+    keys = artifacts.list_artifacts()
+    if not keys:
+        logger.info(f"No artifacts found in {artifacts.ARTIFACTS_DIR}")
+        return 0
+
+    rescored = 0
+    failed = 0
+    mismatched = 0
+    for key in keys:
+        artifact = artifacts.load_artifact(key)
+        if artifact is None or "transcription" not in artifact:
+            logger.warning(f"{key[:12]}: skipped, no usable transcription")
+            failed += 1
+            continue
+
+        check_versions, nlp_changed = artifact_versions(artifact, versions, nlp_name)
+        stale = [stage for stage in artifacts.stale_stages(artifact, check_versions) if stage != "transcription"]
+        if not stale:
+            continue
+
+        if nlp_changed and not args.allow_nlp_change:
+            _, stored_nlp = split_activities_version(artifact["activities"]["version"])
+            logger.warning(f"{key[:12]}: skipped, re-extracting needs {stored_nlp}, not {nlp_name}")
+            mismatched += 1
+            continue
+
+        if args.dry_run:
+            logger.info(f"{key[:12]}: would recompute {', '.join(stale)}")
+            rescored += 1
+            continue
+
+        old_total = get_total(artifact)
+        try:
+            artifacts.rescore_artifact(artifact, check_versions, extract_activities, calculate_emissions, nlp)
+            artifacts.save_artifact(key, artifact)
+        except Exception as e:
+            logger.error(f"{key[:12]}: re-scoring failed: {e}")
+            failed += 1
+            continue
+
+        logger.info(f"{key[:12]}: recomputed {', '.join(stale)} (total {old_total} -> {get_total(artifact)} kg CO2e)")
+        rescored += 1
+
+    action = "Would re-score" if args.dry_run else "Re-scored"
+    logger.info(f"{action} {rescored} of {len(keys)} artifacts ({failed} failed)")
+    if mismatched:
+        logger.warning(
+            f"Skipped {mismatched} artifacts that need re-extracting with a different sentence splitter than {nlp_name}. "
+            "Re-extracting them here would invalidate the server's cached activities; "
+            "use the server's spaCy model or pass --allow-nlp-change."
+        )
+    return 1 if failed or mismatched else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
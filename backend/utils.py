@@ -1,5 +1,7 @@
 # main.py - Integrated version
 import re
+import json
+import hashlib
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import spacy
@@ -70,6 +72,40 @@ ACTIVITY_KEYWORDS = {
     "bus": ["bus", "public transport"],
 }
 
+# Stage versions for cached pipeline artifacts (see artifacts.py).
+# Bump EXTRACTION_VERSION when extract_numbers_and_units, get_smart_defaults
+# or extract_activities change their output; bump CALCULATION_VERSION when
+# calculate_single_emission or get_calculation_details change. Edits to
+# ACTIVITY_KEYWORDS (including reordering, since extract_activities takes the
+# first matching type) and EMISSION_FACTORS are picked up automatically.
+EXTRACTION_VERSION = 1
+CALCULATION_VERSION = 1
+
+def _fingerprint(data, ordered=False):
+    """Short stable hash of a JSON-serialisable table.
+
+    With `ordered`, key order is part of the hash; use it for tables that are
+    walked in order and stop at the first match.
+    """
+    if ordered:
+        data = list(data.items())
+    encoded = json.dumps(data, sort_keys=not ordered).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+def get_nlp_name(nlp=None):
+    """Name of the sentence splitter used for extraction, part of its stage version"""
+    if nlp is None:
+        return "none"
+    meta = getattr(nlp, "meta", {}) or {}
+    return f"{meta.get('lang', 'xx')}_{meta.get('name', 'unknown')}-{meta.get('version', '0')}"
+
+def get_stage_versions(nlp=None):
+    """Return the current version of each re-scorable pipeline stage"""
+    return {
+        "activities": f"{EXTRACTION_VERSION}-{_fingerprint(ACTIVITY_KEYWORDS, ordered=True)}-{get_nlp_name(nlp)}",
+        "emissions": f"{CALCULATION_VERSION}-{_fingerprint(EMISSION_FACTORS)}",
+    }
+
 def extract_numbers_and_units(text):
     """Extract numbers with units from text"""
     result = {}